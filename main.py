@@ -1,14 +1,22 @@
 import streamlit as st
+import asyncio
+import base64
+import concurrent.futures
+import hashlib
 import os
+import random
+import shutil
 import sys
+import threading
 import time
+import zipfile
 import mimetypes
+from collections import OrderedDict
 from datetime import datetime
-from PIL import Image
 from io import BytesIO
-import json
+import logging
 import tempfile
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, NamedTuple, Optional
 from dotenv import load_dotenv
 import time
 
@@ -18,9 +26,84 @@ load_dotenv()
 # Add src to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
+import orjson
+import pymupdf
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from google import genai
-from google.genai import types
+from google.genai import errors, types
+from pydantic import ValidationError
 from src.courtroom_viz.crew import LegalAnalysisCrew
+from src.courtroom_viz.models import IMAGE_SPEC_ADAPTER, IMAGE_SPEC_LIST_ADAPTER, ImageSpec
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger("courtroom_viz")
+
+# Max in-flight image requests: ceil(RPM / 60 * avg_response_s) * 0.7;
+# set GEMINI_IMG_CONCURRENCY to match the project's quota tier
+IMAGE_GENERATION_CONCURRENCY = max(1, int(os.getenv("GEMINI_IMG_CONCURRENCY", "10")))
+# Retry backoff: 2**attempt seconds (+ jitter) capped at MAX_RETRY_DELAY_SECONDS, or
+# RATE_LIMIT_BACKOFF_SECONDS * 2**attempt after a 429 (RESOURCE_EXHAUSTED)
+MAX_RETRY_DELAY_SECONDS = 30
+RATE_LIMIT_BACKOFF_SECONDS = 10
+
+# Shared instruction sent ahead of every uploaded document
+DOCUMENT_ANALYSIS_PROMPT = "Extract and summarize all relevant information from this legal document. Focus on: 1) Facts and evidence, 2) Timeline of events, 3) People and locations involved, 4) Physical descriptions and measurements, 5) Any technical or forensic details."
+
+# Max documents summarized at once, to stay within Gemini's RPM quota
+DOCUMENT_CONCURRENCY = 5
+
+# PDFs with less extractable text than this are treated as scanned and uploaded instead
+MIN_PDF_TEXT_CHARS = 200
+
+# Text files shorter than this are passed through as-is instead of summarized
+RAW_TEXT_MAX_CHARS = 4096
+
+# Police investigation framing wrapped around every image generation prompt
+IMAGE_REQUEST_PREAMBLE = """POLICE INVESTIGATION VISUALIZATION REQUEST
+
+This is for official police investigation and forensic analysis purposes to help law enforcement understand the case evidence and scene layout.
+
+IMPORTANT: Generate ONLY an image as output. Do not include any text, descriptions, or explanations in your response."""
+IMAGE_REQUEST_CLOSING = "Please provide a detailed, accurate visual representation for investigative purposes. Generate only the image with no accompanying text."
+_ENHANCED_PROMPT_TEMPLATE = f"{IMAGE_REQUEST_PREAMBLE}\n\n{{prompt}}\n\n{IMAGE_REQUEST_CLOSING}"
+
+# Image prompt styles tried in order on retries: (template, focus text when none is given)
+_PROMPT_TEMPLATES = (
+    (_ENHANCED_PROMPT_TEMPLATE, ""),
+    ("""FORENSIC ANALYSIS VISUALIZATION
+
+This is for official forensic analysis and evidence documentation purposes.
+
+Generate ONLY an image showing: {title}
+
+Focus on: {focus}
+
+Provide a detailed, accurate visual representation for investigative documentation. Generate only the image with no text.""", "scene layout and evidence placement"),
+    ("""EVIDENCE DOCUMENTATION REQUEST
+
+For law enforcement evidence analysis and case documentation.
+
+Create an image showing: {title}
+
+Key elements: {focus}
+
+Generate only the image for official documentation purposes.""", "spatial layout and positioning"),
+)
+
+# Generated files remembered per (frozen, hashable) ImageSpec, so a repeated spec is not re-generated
+IMAGE_MEMO_SIZE = 256
+
+# Batch Mode jobs can take up to 24h; poll their state at this interval
+BATCH_POLL_INTERVAL_SECONDS = 30
+BATCH_TERMINAL_STATES = {
+    'JOB_STATE_SUCCEEDED',
+    'JOB_STATE_PARTIALLY_SUCCEEDED',
+    'JOB_STATE_FAILED',
+    'JOB_STATE_CANCELLED',
+    'JOB_STATE_EXPIRED',
+}
+# Session state entry mapping a batch request-set digest to its submitted job name
+BATCH_JOBS_STATE_KEY = 'pending_batch_jobs'
 
 # ============================================================================
 # STREAMLIT PAGE CONFIGURATION
@@ -34,7 +117,7 @@ st.set_page_config(
 )
 
 # Custom CSS for professional styling
-st.markdown("""
+_CUSTOM_CSS = """
 <style>
     .main-header {
         text-align: center;
@@ -77,7 +160,15 @@ st.markdown("""
         margin: 1rem 0;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+def inject_css():
+    """Emit the custom stylesheet for this run"""
+    # Must run on every rerun: Streamlit drops any element not re-emitted during a run,
+    # and a cached (replayed) call would resend the same markdown delta anyway
+    st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
+
+inject_css()
 
 # ============================================================================
 # GEMINI CLIENT INITIALIZATION
@@ -98,12 +189,8 @@ def initialize_gemini_client():
         st.stop()
     
     try:
+        # No live test call here: an invalid key surfaces on the first real request
         client = genai.Client(api_key=api_key)
-        # Test the client
-        test_response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents="Test connection"
-        )
         return client
     except Exception as e:
         st.error(f"Failed to initialize Gemini client: {e}")
@@ -113,78 +200,263 @@ def initialize_gemini_client():
 # GEMINI GENERATION ENGINE
 # ============================================================================
 
+# mimetypes.guess_extension results per MIME type (almost always image/png)
+_EXT_CACHE: Dict[str, str] = {}
+
+def _ext(mime_type: str) -> str:
+    """File extension for a MIME type, defaulting to .png"""
+    ext = _EXT_CACHE.get(mime_type)
+    if ext is None:
+        ext = _EXT_CACHE[mime_type] = mimetypes.guess_extension(mime_type or '') or '.png'
+    return ext
+
+def _image_filename(prefix: str, data: bytes, mime_type: str) -> str:
+    """Content-addressed filename, so identical images map to the same file"""
+    digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+    return f"{prefix}_{digest}{_ext(mime_type)}"
+
+def _write_file(filename: str, data: bytes) -> str:
+    """Write bytes to disk and return the filename (runs on the engine's I/O pool)"""
+    # Names are content-addressed: an existing file already holds these exact bytes
+    if not os.path.exists(filename):
+        with open(filename, "wb") as f:
+            f.write(data)
+    return filename
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Check whether a Gemini API error is a 429 RESOURCE_EXHAUSTED response"""
+    return isinstance(error, errors.APIError) and error.code == 429
+
+def _normalize_spec(spec) -> Dict[str, Any]:
+    """Plain-dict view of an image spec (Pydantic ImageSpec or dictionary)"""
+    return spec.model_dump() if hasattr(spec, 'model_dump') else dict(spec)
+
+def _normalize_plan(plan) -> Dict[str, Any]:
+    """Plain-dict view of an image plan, with every image spec normalized"""
+    data = plan.model_dump() if hasattr(plan, 'model_dump') else dict(plan)
+    data['image_specifications'] = [_normalize_spec(s) for s in data.get('image_specifications') or []]
+    return data
+
+def _spec_key(spec: Dict[str, Any]) -> Optional[ImageSpec]:
+    """Hashable ImageSpec for a spec dict, or None when the spec is incomplete"""
+    try:
+        return IMAGE_SPEC_ADAPTER.validate_python(spec)
+    except ValidationError:
+        return None
+
+def _spec_keys(specs: List[Dict[str, Any]]) -> List[Optional[ImageSpec]]:
+    """Hashable ImageSpecs for a whole plan in one validator call, per spec only if one is incomplete"""
+    try:
+        return IMAGE_SPEC_LIST_ADAPTER.validate_python(specs)
+    except ValidationError:
+        return [_spec_key(spec) for spec in specs]
+
+def _plan_spec_keys(plan, specs: List[Dict[str, Any]]) -> List[Optional[ImageSpec]]:
+    """Memo keys for a plan's specs: a validated plan's own ImageSpecs, else validated from the dicts"""
+    model_specs = getattr(plan, 'image_specifications', None)
+    if model_specs and all(isinstance(spec, ImageSpec) for spec in model_specs):
+        return list(model_specs)
+    return _spec_keys(specs)
+
+def _retry_delay(attempt: int, rate_limited: bool) -> float:
+    """Seconds to wait before retry number attempt + 1"""
+    if rate_limited:
+        return RATE_LIMIT_BACKOFF_SECONDS * 2 ** attempt + random.random()
+    return min(MAX_RETRY_DELAY_SECONDS, 2 ** attempt + random.random())
+
+def _response_from_batch(response: Dict[str, Any]) -> types.GenerateContentResponse:
+    """Rebuild the content parts of a Batch Mode (REST JSON) response as SDK objects"""
+    candidates = []
+    for candidate in response.get('candidates', []):
+        parts = []
+        for part in candidate.get('content', {}).get('parts', []):
+            inline_data = part.get('inlineData')
+            if inline_data and inline_data.get('data'):
+                parts.append(types.Part(inline_data=types.Blob(
+                    mime_type=inline_data.get('mimeType', 'image/png'),
+                    data=base64.b64decode(inline_data['data'])
+                )))
+            elif part.get('text'):
+                parts.append(types.Part(text=part['text']))
+        candidates.append(types.Candidate(content=types.Content(role='model', parts=parts)))
+    return types.GenerateContentResponse(candidates=candidates)
+
+def _run_with_ctx(ctx, func, *args) -> Any:
+    """Run func on a worker thread attached to the script run, so st.cache_data works there"""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return func(*args)
+
+class SpilledUpload(NamedTuple):
+    """An uploaded document copied to a temp file, so the engine works from disk"""
+    path: str
+    name: str
+    type: str
+
+# Upload types the engine summarizes; images, audio and video are not read from disk
+DOCUMENT_MIME_TYPES = ("application/pdf", "text/plain")
+
+def spill_uploads(uploaded_files: List) -> List[SpilledUpload]:
+    """Copy each document upload to a temp file in 1MB chunks; callers remove the paths"""
+    spilled = []
+    for uploaded_file in uploaded_files:
+        if uploaded_file.type not in DOCUMENT_MIME_TYPES:
+            continue
+        suffix = os.path.splitext(uploaded_file.name)[1]
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+            spilled.append(SpilledUpload(tmp.name, uploaded_file.name, uploaded_file.type))
+            uploaded_file.seek(0)
+            shutil.copyfileobj(uploaded_file, tmp, length=1 << 20)
+    return spilled
+
+def _file_digest(f) -> str:
+    """Hash a file-like object in 1MB chunks (flat memory) and rewind it"""
+    h = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        h.update(chunk)
+    f.seek(0)
+    return h.hexdigest()
+
+# Summaries are memoized on the file digest, so Streamlit reruns skip the Gemini round-trip
+# without hashing the full bytes. Failures raise instead of returning so they are never cached.
+@st.cache_data(ttl=24*60*60, show_spinner=False)
+def _summarize_file(_engine, digest: str, mime: str, name: str, _path: str) -> str:
+    """Extract and summarize one uploaded document with Gemini"""
+    if mime == "application/pdf":
+        # Extract the text layer locally; no upload or Gemini file processing needed
+        with pymupdf.open(_path) as doc:
+            pdf_text = "\n".join(page.get_text("text") for page in doc)
+        
+        if len(pdf_text.strip()) >= MIN_PDF_TEXT_CHARS:
+            response = _engine._analyze_document(pdf_text)
+        else:
+            # Scanned PDF without a usable text layer: let Gemini read the file itself,
+            # streaming the upload from the spilled temp file
+            gemini_file = _engine.upload_file_to_gemini(_path, mime_type=mime)
+            if not gemini_file:
+                raise RuntimeError(f"Upload of {name} to Gemini Files API failed")
+            response = _engine._analyze_document(gemini_file)
+    else:
+        # Process text files directly
+        with open(_path, 'r', encoding='utf-8', errors='replace') as f:
+            text_content = f.read()
+        # Small files go downstream verbatim; summarizing them would not shrink the context
+        if len(text_content) < RAW_TEXT_MAX_CHARS:
+            return text_content
+        response = _engine._analyze_document(text_content)
+    
+    return response.text if response and hasattr(response, 'text') else ""
+
+def _image_trace() -> Callable[[str], None]:
+    """Per-part diagnostics: always logged, shown in the UI only when the sidebar trace is on"""
+    verbose = st.session_state.get("debug_gemini", False)
+    def trace(message: str) -> None:
+        logger.debug(message)
+        if verbose:
+            st.write(message)
+    return trace
+
 class GeminiVisualizationEngine:
     def __init__(self, client):
         self.client = client
         self.model_image = "gemini-2.5-flash-image-preview"
         self.model_text = "gemini-2.5-flash"
+        # Background pool for image writes so disk I/O overlaps with network reads
+        self._io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        # LRU of ImageSpec -> saved files, shared by every session using this engine
+        self._image_memo: "OrderedDict[ImageSpec, List[str]]" = OrderedDict()
+        # Sessions run on their own script threads, so memo updates are serialized
+        self._image_memo_lock = threading.Lock()
+
+    def _recall_images(self, key: Optional[ImageSpec]) -> Optional[List[str]]:
+        """Saved files for an identical spec generated earlier, if they still exist"""
+        if key is None:
+            return None
+        with self._image_memo_lock:
+            files = self._image_memo.get(key)
+        if files and all(os.path.exists(path) for path in files):
+            with self._image_memo_lock:
+                if key in self._image_memo:
+                    self._image_memo.move_to_end(key)
+            return list(files)
+        return None
 
-    def upload_file_to_gemini(self, file_path: str) -> Any:
-        """Upload file to Gemini Files API"""
+    def _remember_images(self, key: Optional[ImageSpec], files: List[str]):
+        """Record the files generated for a spec, evicting the least recently used"""
+        if key is None:
+            return
+        with self._image_memo_lock:
+            self._image_memo[key] = list(files)
+            self._image_memo.move_to_end(key)
+            while len(self._image_memo) > IMAGE_MEMO_SIZE:
+                self._image_memo.popitem(last=False)
+
+    def _analyze_document(self, payload) -> Any:
+        """Run the document-analysis instruction against one uploaded file or text"""
+        return self.client.models.generate_content(
+            model=self.model_text,
+            contents=[DOCUMENT_ANALYSIS_PROMPT, payload]
+        )
+
+    def upload_file_to_gemini(self, file: Any, mime_type: Optional[str] = None) -> Any:
+        """Upload a file path or file-like object to Gemini Files API"""
         try:
-            uploaded_file = self.client.files.upload(file=file_path)
+            # File-like objects carry no extension, so their MIME type must be given
+            config = types.UploadFileConfig(mime_type=mime_type) if mime_type else None
+            uploaded_file = self.client.files.upload(file=file, config=config)
             return uploaded_file
         except Exception as e:
             st.error(f"Failed to upload file: {e}")
             return None
 
-    def process_files_with_gemini(self, uploaded_files: List) -> str:
-        """Process uploaded files (PDF, TXT) with Gemini"""
-        all_content = ""
+    def process_files_with_gemini(self, uploaded_files: List[SpilledUpload]) -> str:
+        """Process spilled uploads (PDF, TXT) with Gemini, several files at a time"""
+        documents = [f for f in uploaded_files if f.type in DOCUMENT_MIME_TYPES]
+        results = asyncio.run(self._process_all(documents))
         
-        for uploaded_file in uploaded_files:
-            if uploaded_file.type == "application/pdf":
-                # Save uploaded file temporarily
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                    tmp_file.write(uploaded_file.read())
-                    tmp_file_path = tmp_file.name
-                
-                try:
-                    # Upload to Gemini Files API
-                    gemini_file = self.upload_file_to_gemini(tmp_file_path)
-                    if gemini_file:
-                        # Process with Gemini
-                        response = self.client.models.generate_content(
-                            model=self.model_text,
-                            contents=[
-                                "Extract and summarize all relevant information from this legal document. Focus on: 1) Facts and evidence, 2) Timeline of events, 3) People and locations involved, 4) Physical descriptions and measurements, 5) Any technical or forensic details.",
-                                gemini_file
-                            ]
-                        )
-                        if response and hasattr(response, 'text'):
-                            all_content += f"\n\n--- Document: {uploaded_file.name} ---\n"
-                            all_content += response.text
-                
-                finally:
-                    # Clean up temp file
-                    os.unlink(tmp_file_path)
-            
-            elif uploaded_file.type == "text/plain":
-                # Process text files directly
-                try:
-                    # Read text content
-                    text_content = uploaded_file.read().decode('utf-8')
-                    
-                    # Process with Gemini for analysis
-                    response = self.client.models.generate_content(
-                        model=self.model_text,
-                        contents=[
-                            "Analyze this legal document text and extract key information. Focus on: 1) Facts and evidence, 2) Timeline of events, 3) People and locations involved, 4) Physical descriptions and measurements, 5) Any technical or forensic details.",
-                            text_content
-                        ]
-                    )
-                    if response and hasattr(response, 'text'):
-                        all_content += f"\n\n--- Document: {uploaded_file.name} ---\n"
-                        all_content += response.text
-                
-                except Exception as e:
-                    st.error(f"Error processing text file {uploaded_file.name}: {e}")
+        # Combine in upload order so the document headings keep their sequence
+        all_content = ""
+        for uploaded_file, result in zip(documents, results):
+            if isinstance(result, Exception):
+                st.error(f"Error processing file {uploaded_file.name}: {result}")
+                if uploaded_file.type == "text/plain":
                     # Fallback: use raw text content
                     all_content += f"\n\n--- Document: {uploaded_file.name} (Raw Text) ---\n"
-                    all_content += text_content
+                    with open(uploaded_file.path, 'r', encoding='utf-8', errors='replace') as f:
+                        all_content += f.read()
+            elif result:
+                all_content += f"\n\n--- Document: {uploaded_file.name} ---\n"
+                all_content += result
         
         return all_content
 
+    async def _process_all(self, uploaded_files: List) -> List[Any]:
+        """Summarize every file concurrently; failures are returned in place of summaries"""
+        sem = asyncio.Semaphore(DOCUMENT_CONCURRENCY)
+        ctx = get_script_run_ctx()
+        return await asyncio.gather(
+            *[self._process_one(uploaded_file, sem, ctx) for uploaded_file in uploaded_files],
+            return_exceptions=True
+        )
+
+    async def _process_one(self, uploaded_file, sem, ctx) -> str:
+        """Summarize one file on a worker thread (the Gemini SDK call and cache lookup block)"""
+        async with sem:
+            # run_in_executor rather than asyncio.to_thread, which needs Python 3.9
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, _run_with_ctx, ctx, self._summarize_upload, uploaded_file)
+
+    def _summarize_upload(self, uploaded_file: SpilledUpload) -> str:
+        """Digest a spilled upload and return its (memoized) summary"""
+        with open(uploaded_file.path, 'rb') as f:
+            digest = _file_digest(f)
+        return _summarize_file(
+            self,
+            digest,
+            uploaded_file.type,
+            uploaded_file.name,
+            uploaded_file.path
+        )
+
     def generate_scene_visualization(self, scene_analysis: str, style: str = "professional") -> List[str]:
         """Generate crime scene visualizations from scene analysis"""
         
@@ -230,29 +502,22 @@ class GeminiVisualizationEngine:
             st.error(f"Failed to generate visualization: {e}")
             return []
 
-    def generate_images_from_plan(self, image_generation_plan) -> List[str]:
+    def generate_images_from_plan(self, image_generation_plan, batch_mode: bool = False) -> List[str]:
         """Generate images based on AI-generated image plan"""
         
         if not image_generation_plan:
             st.error("No image generation plan provided")
             return []
         
-        # Handle both Pydantic model and dictionary
-        if hasattr(image_generation_plan, 'image_specifications'):
-            # Pydantic model
-            image_specs = image_generation_plan.image_specifications
-            total_images = image_generation_plan.total_images
-            narrative_flow = image_generation_plan.narrative_flow
-            visual_consistency = image_generation_plan.visual_consistency
-        else:
-            # Dictionary
-            if 'image_specifications' not in image_generation_plan:
-                st.error("No image specifications found in plan")
-                return []
-            image_specs = image_generation_plan['image_specifications']
-            total_images = len(image_specs)
-            narrative_flow = image_generation_plan.get('narrative_flow', '')
-            visual_consistency = image_generation_plan.get('visual_consistency', {})
+        # Normalize Pydantic model or dictionary once; everything below works on plain dicts
+        plan = _normalize_plan(image_generation_plan)
+        image_specs = plan['image_specifications']
+        if not image_specs:
+            st.error("No image specifications found in plan")
+            return []
+        total_images = len(image_specs)
+        narrative_flow = plan.get('narrative_flow', '')
+        visual_consistency = plan.get('visual_consistency', {})
         
         st.info(f"🎬 Generating {total_images} images based on AI analysis...")
         
@@ -266,182 +531,272 @@ class GeminiVisualizationEngine:
             st.write("🎨 **Visual Consistency Guidelines:**")
             st.write(visual_consistency)
         
-        saved_files = []
+        if batch_mode:
+            # Submit every image as one Gemini Batch Mode job (cheaper, slower)
+            saved_files = self._generate_images_batch(image_specs)
+        else:
+            # Generate all images concurrently with retry mechanism. Validated plans
+            # already hold frozen ImageSpecs; only dict plans are validated for memo keys
+            memo_keys = _plan_spec_keys(image_generation_plan, image_specs)
+            saved_files = self._generate_images_concurrent(image_specs, total_images, memo_keys)
         
-        # Generate all images sequentially (one by one) with retry mechanism
-        saved_files = self._generate_images_sequential(image_specs, total_images)
+        return saved_files
+
+    def _generate_images_batch(self, image_specs) -> List[str]:
+        """Generate images through Gemini Batch Mode (50% cheaper, results within 24h)"""
+        requests = []
+        prefixes = {}
+        
+        for index, image_spec in enumerate(image_specs):
+            image_number = image_spec.get('image_number', index+1)
+            title = image_spec.get('title', 'Untitled')
+            generation_prompt = image_spec.get('generation_prompt', '')
+            
+            if not generation_prompt:
+                st.error(f"⚠️ No generation prompt provided for image {image_number}")
+                continue
+            
+            # Keyed on the plan position: image numbers may repeat or be missing
+            key = f"image_{index}"
+            prefixes[key] = f"image_{image_number}_{title.replace(' ', '_').lower()}"
+            requests.append({
+                'key': key,
+                'request': {
+                    'contents': [{
+                        'role': 'user',
+                        'parts': [{'text': self._build_enhanced_prompt(generation_prompt)}]
+                    }],
+                    'generation_config': {'responseModalities': ['IMAGE', 'TEXT']}
+                }
+            })
+        
+        if not requests:
+            return []
         
+        # Record the job in session state so a rerun or reconnect with the same requests
+        # resumes polling the paid job instead of losing it or submitting another
+        digest = hashlib.blake2b(orjson.dumps(requests), digest_size=16).hexdigest()
+        pending_jobs = st.session_state.setdefault(BATCH_JOBS_STATE_KEY, {})
+        
+        status_text = st.empty()
+        try:
+            job_name = pending_jobs.get(digest)
+            if job_name:
+                st.info(f"♻️ Resuming batch job {job_name}")
+            else:
+                job_name = pending_jobs[digest] = self._submit_batch(requests)
+            job = self._wait_for_batch(job_name, status_text)
+        except Exception as e:
+            st.error(f"❌ Batch generation failed: {e}")
+            return []
+        
+        # Terminal state: results are collected below, or a retry submits a fresh job
+        pending_jobs.pop(digest, None)
+        
+        if job.state.name not in ('JOB_STATE_SUCCEEDED', 'JOB_STATE_PARTIALLY_SUCCEEDED'):
+            st.error(f"❌ Batch job {job_name} finished with state {job.state.name}")
+            return []
+        
+        # Each output line holds the original key and either a response or an error
+        saved_files = []
+        output = self.client.files.download(file=job.dest.file_name)
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            result = orjson.loads(line)
+            key = result.get('key', 'image')
+            if 'response' not in result:
+                st.warning(f"⚠️ Batch request {key} failed: {result.get('error')}")
+                continue
+            response = _response_from_batch(result['response'])
+            saved_files.extend(self._extract_and_save_images(response, prefixes.get(key, key)))
+        
+        status_text.text(f"✅ Completed: {len(saved_files)} images generated successfully")
         return saved_files
 
-    def _generate_images_sequential(self, image_specs, total_images) -> List[str]:
-        """Generate images sequentially (one by one) with retry mechanism"""
+    def _submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Upload requests as a JSONL file and create a Batch Mode job, returning its name"""
+        with tempfile.NamedTemporaryFile("wb", delete=False, suffix='.jsonl') as tmp_file:
+            tmp_file.writelines(orjson.dumps(request) + b"\n" for request in requests)
+            tmp_file_path = tmp_file.name
+        
+        try:
+            batch_input = self.client.files.upload(
+                file=tmp_file_path,
+                config=types.UploadFileConfig(mime_type='jsonl')
+            )
+        finally:
+            # Clean up temp file
+            os.unlink(tmp_file_path)
+        
+        job = self.client.batches.create(
+            model=self.model_image,
+            src=batch_input.name,
+            config={'display_name': f"courtroom_viz_{datetime.now().strftime('%Y%m%d_%H%M%S')}"}
+        )
+        return job.name
+
+    def _wait_for_batch(self, job_name: str, status_text) -> Any:
+        """Poll a Batch Mode job until it reaches a terminal state"""
+        while True:
+            job = self.client.batches.get(name=job_name)
+            if job.state.name in BATCH_TERMINAL_STATES:
+                return job
+            status_text.text(f"⏳ Batch job {job_name} is {job.state.name} - checking again in {BATCH_POLL_INTERVAL_SECONDS}s...")
+            time.sleep(BATCH_POLL_INTERVAL_SECONDS)
+
+    def _build_enhanced_prompt(self, generation_prompt: str) -> str:
+        """Wrap a generation prompt with police investigation context and an image-only request"""
+        return _ENHANCED_PROMPT_TEMPLATE.format(prompt=generation_prompt)
+
+    def _image_config(self) -> types.GenerateContentConfig:
+        """Build the image generation config"""
+        return types.GenerateContentConfig(
+            response_modalities=['IMAGE', 'TEXT']
+        )
+
+    def _generate_images_concurrent(self, image_specs, total_images, memo_keys) -> List[str]:
+        """Generate images concurrently (bounded by a semaphore) with retry mechanism"""
+        return asyncio.run(self._generate_images_async(image_specs, total_images, memo_keys))
+
+    async def _generate_images_async(self, image_specs, total_images, memo_keys) -> List[str]:
+        """Run one generation task per image spec and report progress as each finishes"""
         saved_files = []
         
         # Create progress tracking
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        for index, image_spec in enumerate(image_specs):
+        sem = asyncio.Semaphore(max(1, min(len(image_specs), IMAGE_GENERATION_CONCURRENCY)))
+        tasks = [
+            asyncio.ensure_future(self._agen_one(index, image_spec, memo_key, sem, status_text))
+            for index, (image_spec, memo_key) in enumerate(zip(image_specs, memo_keys))
+        ]
+        
+        # Update progress as each image finishes, in completion order
+        for completed, future in enumerate(asyncio.as_completed(tasks), start=1):
             try:
-                # Handle both Pydantic model and dictionary
-                if hasattr(image_spec, 'image_number'):
-                    # Pydantic model
-                    image_number = image_spec.image_number
-                    title = image_spec.title
-                    purpose = image_spec.purpose
-                    angle_description = image_spec.angle_description
-                    focus_elements = image_spec.focus_elements
-                    generation_prompt = image_spec.generation_prompt
-                else:
-                    # Dictionary
-                    image_number = image_spec.get('image_number', index+1)
-                    title = image_spec.get('title', 'Untitled')
-                    purpose = image_spec.get('purpose', 'N/A')
-                    angle_description = image_spec.get('angle_description', 'N/A')
-                    focus_elements = image_spec.get('focus_elements', [])
-                    generation_prompt = image_spec.get('generation_prompt', '')
-                
-                if not generation_prompt:
-                    st.error(f"⚠️ No generation prompt provided for image {image_number}")
-                    continue
-                
-                # Enhance the prompt with police investigation context and image-only request
-                enhanced_prompt = f"""POLICE INVESTIGATION VISUALIZATION REQUEST
-
-This is for official police investigation and forensic analysis purposes to help law enforcement understand the case evidence and scene layout.
-
-IMPORTANT: Generate ONLY an image as output. Do not include any text, descriptions, or explanations in your response.
-
-{generation_prompt}
+                await future
+            except Exception:
+                pass  # Reported below via gather
+            progress_bar.progress(min(completed / total_images, 1.0))
+            status_text.text(f"📊 Progress: {completed}/{total_images} images completed")
+        
+        # Collect results in plan order so files follow the narrative sequence
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                st.error(f"❌ Error processing image {index + 1}: {result}")
+            else:
+                saved_files.extend(result)
+        
+        # Final status update
+        status_text.text(f"✅ Completed: {len(saved_files)} images generated successfully")
+        progress_bar.progress(1.0)
+        
+        return saved_files
 
-Please provide a detailed, accurate visual representation for investigative purposes. Generate only the image with no accompanying text."""
+    async def _agen_one(self, index, image_spec, memo_key, sem, status_text) -> List[str]:
+        """Generate a single image spec, retrying with different prompt styles"""
+        image_number = image_spec.get('image_number', index+1)
+        title = image_spec.get('title', 'Untitled')
+        focus_elements = image_spec.get('focus_elements', [])
+        generation_prompt = image_spec.get('generation_prompt', '')
+        
+        if not generation_prompt:
+            st.error(f"⚠️ No generation prompt provided for image {image_number}")
+            return []
+        
+        # An identical spec was already generated; reuse its files instead of another API call
+        remembered = self._recall_images(memo_key)
+        if remembered:
+            st.info(f"♻️ Reusing previously generated Image {image_number}: {title}")
+            return remembered
+        
+        # Retry mechanism with multiple attempts and different prompt styles
+        max_retries = 3
+        prefix = f"image_{image_number}_{title.replace(' ', '_').lower()}"
+        
+        # Render every prompt style once per image; retries index into them
+        focus = ', '.join(focus_elements or [])
+        prompt_styles = [
+            template.format(prompt=generation_prompt, title=title, focus=focus or fallback_focus)
+            for template, fallback_focus in _PROMPT_TEMPLATES
+        ]
+        
+        # Build the request contents and config once per style, reused across retries
+        style_requests = [
+            (
+                [types.Content(role="user", parts=[types.Part.from_text(text=style)])],
+                self._image_config()
+            )
+            for style in prompt_styles
+        ]
+        
+        async with sem:
+            for attempt in range(max_retries):
+                rate_limited = False
                 
-                # Use the correct API format for image generation
-                contents = [
-                    types.Content(
-                        role="user",
-                        parts=[
-                            types.Part.from_text(text=enhanced_prompt),
-                        ],
-                    ),
-                ]
+                # Try different prompt styles
+                contents, config = style_requests[attempt % len(style_requests)]
                 
-                # Retry mechanism with multiple attempts and different prompt styles
-                max_retries = 3
-                files = []
+                status_text.text(f"🔄 Generating Image {image_number}: {title} (Attempt {attempt + 1}/{max_retries})")
                 
-                # Different prompt styles to try
-                prompt_styles = [
-                    enhanced_prompt,  # Original enhanced prompt
-                    f"""FORENSIC ANALYSIS VISUALIZATION
-
-This is for official forensic analysis and evidence documentation purposes.
-
-Generate ONLY an image showing: {title}
-
-Focus on: {', '.join(focus_elements) if focus_elements else 'scene layout and evidence placement'}
-
-Provide a detailed, accurate visual representation for investigative documentation. Generate only the image with no text.""",
-                    
-                    f"""EVIDENCE DOCUMENTATION REQUEST
-
-For law enforcement evidence analysis and case documentation.
-
-Create an image showing: {title}
-
-Key elements: {', '.join(focus_elements) if focus_elements else 'spatial layout and positioning'}
-
-Generate only the image for official documentation purposes."""
-                ]
+                # Try streaming method first (more reliable for image generation)
+                try:
+                    files = await self._generate_image_streaming(contents, prefix, config)
+                    if files:
+                        st.success(f"✅ Generated Image {image_number} - {len(files)} files (Streaming method, Attempt {attempt + 1})")
+                        self._remember_images(memo_key, files)
+                        return files
+                    st.warning(f"⚠️ No image generated with streaming method for Image {image_number} (Attempt {attempt + 1})")
+                except Exception as e:
+                    rate_limited = _is_rate_limited(e)
+                    st.warning(f"⚠️ Streaming method failed for Image {image_number} (Attempt {attempt + 1}): {e}")
                 
-                for attempt in range(max_retries):
-                    # Try different prompt styles
-                    current_prompt = prompt_styles[attempt % len(prompt_styles)]
-                    
-                    # Update contents with current prompt style
-                    contents = [
-                        types.Content(
-                            role="user",
-                            parts=[
-                                types.Part.from_text(text=current_prompt),
-                            ],
-                        ),
-                    ]
-                    
-                    status_text.text(f"🔄 Generating Image {image_number}: {title} (Attempt {attempt + 1}/{max_retries})")
-                    
-                    # Try streaming method first (more reliable for image generation)
-                    try:
-                        files = self._generate_image_streaming(contents, f"image_{image_number}_{title.replace(' ', '_').lower()}")
-                        if files and len(files) > 0:
-                            st.success(f"✅ Generated Image {image_number} - {len(files)} files (Streaming method, Attempt {attempt + 1})")
-                            saved_files.extend(files)
-                            break
-                        else:
-                            st.warning(f"⚠️ No image generated with streaming method for Image {image_number} (Attempt {attempt + 1})")
-                    except Exception as e:
-                        st.warning(f"⚠️ Streaming method failed for Image {image_number} (Attempt {attempt + 1}): {e}")
-                    
-                    # Fallback to non-streaming method if streaming failed or returned no files
+                # Fallback to non-streaming method if streaming failed or returned no files
+                if not rate_limited:
                     status_text.text(f"🔄 Trying non-streaming method for Image {image_number} (Attempt {attempt + 1})...")
                     
                     try:
-                        response = self.client.models.generate_content(
+                        response = await self.client.aio.models.generate_content(
                             model=self.model_image,
                             contents=contents,
-                            config=types.GenerateContentConfig(
-                                response_modalities=['IMAGE', 'TEXT']
-                            )
+                            config=config
                         )
                         
-                        files = self._extract_and_save_images(response, f"image_{image_number}_{title.replace(' ', '_').lower()}")
-                        
-                        if files and len(files) > 0:
+                        files = await self._aextract_and_save_images(response, prefix)
+                        if files:
                             st.success(f"✅ Generated Image {image_number} - {len(files)} files (Fallback method, Attempt {attempt + 1})")
-                            saved_files.extend(files)
-                            break
-                        else:
-                            st.warning(f"⚠️ No image generated with fallback method for Image {image_number} (Attempt {attempt + 1})")
-                            
+                            self._remember_images(memo_key, files)
+                            return files
+                        st.warning(f"⚠️ No image generated with fallback method for Image {image_number} (Attempt {attempt + 1})")
+                    
                     except Exception as e:
+                        rate_limited = _is_rate_limited(e)
                         st.warning(f"⚠️ Fallback method failed for Image {image_number} (Attempt {attempt + 1}): {e}")
-                    
-                    # Wait before retry (except for last attempt)
-                    if attempt < max_retries - 1:
-                        status_text.text(f"⏳ Waiting 2 seconds before retry for Image {image_number}...")
-                        time.sleep(2)
-                
-                # Check if image was successfully generated
-                if not files or len(files) == 0:
-                    st.error(f"❌ Failed to generate Image {image_number} after {max_retries} attempts")
-                
-                # Update progress bar
-                progress_bar.progress((index + 1) / total_images)
-                status_text.text(f"📊 Progress: {index + 1}/{total_images} images completed")
                 
-            except Exception as e:
-                st.error(f"❌ Error processing image {image_number}: {e}")
-                # Update progress bar even on error
-                progress_bar.progress((index + 1) / total_images)
-        
-        # Final status update
-        status_text.text(f"✅ Completed: {len(saved_files)} images generated successfully")
-        progress_bar.progress(1.0)
+                # Wait before retry (except for last attempt): exponential backoff with jitter,
+                # much longer when Gemini reported a rate limit
+                if attempt < max_retries - 1:
+                    delay = _retry_delay(attempt, rate_limited)
+                    status_text.text(f"⏳ Waiting {delay:.1f} seconds before retry for Image {image_number}...")
+                    await asyncio.sleep(delay)
         
-        return saved_files
+        st.error(f"❌ Failed to generate Image {image_number} after {max_retries} attempts")
+        return []
 
-    def _generate_image_streaming(self, contents, prefix: str = "image") -> List[str]:
+    async def _generate_image_streaming(self, contents, prefix: str = "image", config=None) -> List[str]:
         """Generate images using streaming method (more reliable)"""
         saved_files = []
-        file_index = 0
+        pending_writes = []
+        loop = asyncio.get_running_loop()
         
         try:
-            for chunk in self.client.models.generate_content_stream(
+            async for chunk in await self.client.aio.models.generate_content_stream(
                 model=self.model_image,
                 contents=contents,
-                config=types.GenerateContentConfig(
-                    response_modalities=['IMAGE', 'TEXT']
-                )
+                config=config or self._image_config()
             ):
                 if (
                     chunk.candidates is None
@@ -453,139 +808,206 @@ Generate only the image for official documentation purposes."""
                 if (chunk.candidates[0].content.parts[0].inline_data and 
                     chunk.candidates[0].content.parts[0].inline_data.data):
                     
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     inline_data = chunk.candidates[0].content.parts[0].inline_data
                     data_buffer = inline_data.data
-                    file_extension = mimetypes.guess_extension(inline_data.mime_type) or '.png'
-                    filename = f"{prefix}_{timestamp}_{file_index}{file_extension}"
+                    filename = _image_filename(prefix, data_buffer, inline_data.mime_type)
                     
-                    try:
-                        with open(filename, "wb") as f:
-                            f.write(data_buffer)
-                        saved_files.append(filename)
-                        st.write(f" ✅ **Saved image:** {filename}")
-                        file_index += 1
-                    except Exception as e:
-                        st.error(f"❌ **Failed to save image:** {e}")
+                    # Write on the I/O pool so the next chunk is read while the disk works
+                    pending_writes.append(loop.run_in_executor(self._io_pool, _write_file, filename, data_buffer))
                 else:
                     # Print any text output
                     if hasattr(chunk, 'text') and chunk.text:
                         st.write(f"📝 **Text output:** {chunk.text}")
-                        
-        except Exception as e:
-            st.error(f"❌ **Streaming generation failed:** {e}")
+        finally:
+            for result in await asyncio.gather(*pending_writes, return_exceptions=True):
+                if isinstance(result, Exception):
+                    st.error(f"❌ **Failed to save image:** {result}")
+                else:
+                    saved_files.append(result)
+                    st.write(f" ✅ **Saved image:** {result}")
         
         return saved_files
 
     def _extract_and_save_images(self, response, prefix: str = "image") -> List[str]:
         """Extract and save images from Gemini response"""
-        saved_files = []
+        trace = _image_trace()
+        pending_writes = self._queue_image_writes(response, prefix, trace)
         
+        # Wait for the background writes only once every part has been queued
+        outcomes = []
+        for future in pending_writes:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+        return self._report_saved_images(response, outcomes, trace)
+
+    async def _aextract_and_save_images(self, response, prefix: str = "image") -> List[str]:
+        """Extract and save images from Gemini response without blocking the event loop"""
+        trace = _image_trace()
+        pending_writes = self._queue_image_writes(response, prefix, trace)
+        outcomes = await asyncio.gather(
+            *(asyncio.wrap_future(future) for future in pending_writes),
+            return_exceptions=True
+        )
+        return self._report_saved_images(response, outcomes, trace)
+
+    def _report_saved_images(self, response, outcomes, trace) -> List[str]:
+        """Saved filenames from the write outcomes, reporting each failed write"""
         if not response:
             st.write("❌ **No response received**")
-            return saved_files
+            return []
+        
+        saved_files = []
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                st.error(f"      ❌ **Failed to save image:** {outcome}")
+            else:
+                saved_files.append(outcome)
+                trace(f" ✅ **Saved image:** {outcome}")
+        
+        st.write(f"📊 {len(saved_files)} images extracted")
+        return saved_files
+
+    def _queue_image_writes(self, response, prefix: str, trace) -> List[concurrent.futures.Future]:
+        """Submit a background write for every inline image part of a Gemini response"""
+        pending_writes = []
+        if not response:
+            return pending_writes
         
-        st.write(f"🔍 **Analyzing response for images...**")
-        st.write(f"**Response type:** {type(response)}")
+        trace(f"🔍 **Analyzing response for images...**")
+        trace(f"**Response type:** {type(response)}")
         
         if hasattr(response, 'candidates') and response.candidates:
-            st.write(f"**Candidates found:** {len(response.candidates)}")
+            trace(f"**Candidates found:** {len(response.candidates)}")
             
             for i, candidate in enumerate(response.candidates):
-                st.write(f"**Candidate {i}:** {type(candidate)}")
+                trace(f"**Candidate {i}:** {type(candidate)}")
                 
                 if hasattr(candidate, 'content') and candidate.content:
-                    st.write(f"  - Has content: {candidate.content is not None}")
+                    trace(f"  - Has content: {candidate.content is not None}")
                     
                     if hasattr(candidate.content, 'parts'):
-                        st.write(f"  - Parts count: {len(candidate.content.parts)}")
+                        trace(f"  - Parts count: {len(candidate.content.parts)}")
                         
                         for j, part in enumerate(candidate.content.parts):
-                            st.write(f"    - Part {j}: {type(part)}")
+                            trace(f"    - Part {j}: {type(part)}")
                             
                             if hasattr(part, 'inline_data') and part.inline_data:
-                                st.write(f"      - Has inline_data: {part.inline_data is not None}")
+                                trace(f"      - Has inline_data: {part.inline_data is not None}")
                                 
                                 if hasattr(part.inline_data, 'data') and part.inline_data.data:
-                                    st.write(f"      - Has data: {len(part.inline_data.data)} bytes")
+                                    trace(f"      - Has data: {len(part.inline_data.data)} bytes")
                                     
-                                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                                     mime_type = getattr(part.inline_data, 'mime_type', 'image/png')
-                                    ext = mimetypes.guess_extension(mime_type) or '.png'
-                                    filename = f"{prefix}_{timestamp}_{i}_{j}{ext}"
+                                    filename = _image_filename(prefix, part.inline_data.data, mime_type)
                                     
-                                    try:
-                                        with open(filename, "wb") as f:
-                                            f.write(part.inline_data.data)
-                                        
-                                        saved_files.append(filename)
-                                        st.write(f" ✅ **Saved image:** {filename}")
-
-                                    except Exception as e:
-                                        st.error(f"      ❌ **Failed to save image:** {e}")
+                                    pending_writes.append(self._io_pool.submit(_write_file, filename, part.inline_data.data))
                                 else:
-                                    st.write(f"      - No data in inline_data")
+                                    trace(f"      - No data in inline_data")
                             else:
-                                st.write(f"      - No inline_data")
+                                trace(f"      - No inline_data")
                     else:
-                        st.write(f"  - No parts in content")
+                        trace(f"  - No parts in content")
                 else:
-                    st.write(f"  - No content in candidate")
+                    trace(f"  - No content in candidate")
         else:
-            st.write("❌ **No candidates in response**")
+            trace("❌ **No candidates in response**")
         
-        st.write(f"📊 **Total images extracted:** {len(saved_files)}")
-        return saved_files
+        return pending_writes
 
 # ============================================================================
 # STREAMLIT UI COMPONENTS
 # ============================================================================
 
+# Static HTML is built once at import; only the dashboard status lines change per run
+_HEADER_HTML = """
+<div class="main-header">
+    <h1>🔍 CrimeSceneViz</h1>
+    <p>Transform Crime Scene Evidence into Detailed Forensic Visualizations</p>
+    <p><em>Powered by Gemini 2.5 Flash Image Preview • Built for the Nano Banana Hackathon</em></p>
+</div>
+"""
+
+_FOOTER_HTML = """
+<div style="text-align: center; padding: 2rem; color: #666;">
+    <h4>🍌 Built for Nano Banana Hackathon 2025</h4>
+    <p>Leveraging Gemini 2.5 Flash Image Preview for revolutionary legal visualization</p>
+    <p><strong>Key Features:</strong> PDF Processing • Multi-Agent AI Analysis • Multi-Angle Generation • Character Consistency</p>
+</div>
+"""
+
+_STEP_BOX_HTML = '<div class="step-box"><h4>{title}</h4><p>{status}</p></div>'
+
+# (key, title, initial status) for each processing dashboard column
+_DASHBOARD_STAGES = (
+    ("documents", "📄 Document Analysis", "Processing uploaded files..."),
+    ("agents", "🤖 AI Agent Analysis", "Crew AI analyzing evidence..."),
+    ("scenes", "🎨 Scene Generation", "Creating visualizations..."),
+    ("court", "⚖️ Court Ready", "Final presentation prep..."),
+)
+
 def render_header():
     """Render the main header"""
-    st.markdown("""
-    <div class="main-header">
-        <h1>🔍 CrimeSceneViz</h1>
-        <p>Transform Crime Scene Evidence into Detailed Forensic Visualizations</p>
-        <p><em>Powered by Gemini 2.5 Flash Image Preview • Built for the Nano Banana Hackathon</em></p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_HEADER_HTML, unsafe_allow_html=True)
 
+@st.fragment
 def render_sidebar():
-    """Render sidebar configuration"""
-    with st.sidebar:
-        st.header("⚙️ Case Configuration")
-        
-        case_type = st.selectbox(
-            "Case Type",
-            ["Traffic Accident", "Crime Scene", "Personal Injury", "Property Dispute", "Medical Malpractice"]
-        )
-        
-        visualization_style = st.selectbox(
-            "Crime Scene Style",
-            ["professional", "technical", "dramatic", "jury_friendly"],
-            help="Choose the forensic documentation style for crime scene reconstruction"
-        )
-        
-        st.info("🤖 **AI will determine the optimal number of images based on case complexity**")
-        
-        st.divider()
-        
-        st.subheader("🎯 Generation Settings")
-        quality_level = st.slider("Quality Level", 1, 10, 8)
-        include_measurements = st.checkbox("Include Forensic Measurements", True)
-        expert_review = st.checkbox("Expert Review Mode", False)
-        
-        return {
-            'case_type': case_type,
-            'style': visualization_style,
-            'quality': quality_level,
-            'measurements': include_measurements,
-            'expert_review': expert_review
-        }
+    """Render sidebar configuration into st.session_state['config']
+
+    A fragment, so changing a setting reruns only this function; main() wraps
+    the call in st.sidebar because fragments cannot open containers outside
+    their own body.
+    """
+    st.header("⚙️ Case Configuration")
+    
+    case_type = st.selectbox(
+        "Case Type",
+        ["Traffic Accident", "Crime Scene", "Personal Injury", "Property Dispute", "Medical Malpractice"]
+    )
+    
+    visualization_style = st.selectbox(
+        "Crime Scene Style",
+        ["professional", "technical", "dramatic", "jury_friendly"],
+        help="Choose the forensic documentation style for crime scene reconstruction"
+    )
+    
+    st.info("🤖 **AI will determine the optimal number of images based on case complexity**")
+    
+    st.divider()
+    
+    st.subheader("🎯 Generation Settings")
+    quality_level = st.slider("Quality Level", 1, 10, 8)
+    include_measurements = st.checkbox("Include Forensic Measurements", True)
+    expert_review = st.checkbox("Expert Review Mode", False)
+    st.checkbox(
+        "Verbose Gemini trace",
+        False,
+        key="debug_gemini",
+        help="Show per-candidate and per-part details of every Gemini image response"
+    )
+    batch_mode = st.checkbox(
+        "Batch mode (50% cheaper, up to 24h)",
+        False,
+        help="Submit all images as one Gemini Batch Mode job instead of live requests"
+    )
+    
+    st.session_state['config'] = {
+        'case_type': case_type,
+        'style': visualization_style,
+        'quality': quality_level,
+        'measurements': include_measurements,
+        'expert_review': expert_review,
+        'batch_mode': batch_mode
+    }
 
+@st.fragment
 def render_input_section():
-    """Render input section with tabs"""
+    """Render input section with tabs into st.session_state['case_input']
+
+    A fragment, so uploading or typing reruns only this section until the
+    process button triggers a full run.
+    """
     st.subheader("📋 Case Input")
     
     tab1, tab2, tab3 = st.tabs(["📄 Document Upload", "✏️ Text Input", "🔧 Advanced"])
@@ -642,82 +1064,92 @@ def render_input_section():
             'custom_prompt': custom_prompt
         }
         
-    return uploaded_files, raw_text, advanced_config
+    st.session_state['case_input'] = (uploaded_files, raw_text, advanced_config)
+
+def render_processing_dashboard() -> Dict[str, Any]:
+    """Render real-time processing dashboard.
 
-def render_processing_dashboard():
-    """Render real-time processing dashboard"""
+    Returns a placeholder per stage so callers can update the status line in
+    place instead of re-rendering the column layout.
+    """
     st.subheader("⚡ Processing Pipeline")
     
     # Create columns for different processing stages
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown("""
-        <div class="step-box">
-            <h4>📄 Document Analysis</h4>
-            <p>Processing uploaded files...</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
-        <div class="step-box">
-            <h4>🤖 AI Agent Analysis</h4>
-            <p>Crew AI analyzing evidence...</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown("""
-        <div class="step-box">
-            <h4>🎨 Scene Generation</h4>
-            <p>Creating visualizations...</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        st.markdown("""
-        <div class="step-box">
-            <h4>⚖️ Court Ready</h4>
-            <p>Final presentation prep...</p>
-        </div>
-        """, unsafe_allow_html=True)
-
-def render_results_section(generated_images: List[str], analysis_result: Dict[str, Any]):
+    placeholders = {}
+    for col, (key, title, status) in zip(st.columns(len(_DASHBOARD_STAGES)), _DASHBOARD_STAGES):
+        with col:
+            placeholders[key] = st.empty()
+            placeholders[key].markdown(
+                _STEP_BOX_HTML.format(title=title, status=status),
+                unsafe_allow_html=True
+            )
+    return placeholders
+
+def update_dashboard_stage(placeholders: Dict[str, Any], key: str, status: str):
+    """Swap the status text of one dashboard stage"""
+    title = next(t for k, t, _ in _DASHBOARD_STAGES if k == key)
+    placeholders[key].markdown(
+        _STEP_BOX_HTML.format(title=title, status=status),
+        unsafe_allow_html=True
+    )
+
+# Each entry holds a whole image set in memory; keep only a few recent sets per process
+@st.cache_data(max_entries=8, ttl=60*60, show_spinner=False)
+def _images_zip(image_paths: tuple) -> bytes:
+    """ZIP the generated images once per set of paths (stored; PNGs are already compressed)"""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for i, image_path in enumerate(image_paths):
+            archive.write(image_path, arcname=f"courtroom_viz_{i+1}{os.path.splitext(image_path)[1]}")
+    return buffer.getvalue()
+
+def _analysis_json(analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-safe view of an analysis result for the debug expanders"""
+    view = dict(analysis_result)
+    plan = view.get('structured_analysis')
+    if plan is not None:
+        view['structured_analysis'] = plan.model_dump(mode='json')
+    return view
+
+def render_results_section(generated_images: List[str], analysis_result: Dict[str, Any], debug: bool = False):
     """Render results with generated visualizations"""
     st.subheader("📊 Generated Visualizations")
     
     if generated_images:
-        # Display images in a grid
-        cols = st.columns(2)
-        for i, image_path in enumerate(generated_images):
-            col = cols[i % 2]
-            with col:
-                try:
-                    image = Image.open(image_path)
-                    st.image(image, caption=f"Visualization {i+1}", use_column_width=True)
-                    
-                    # Download button
-                    with open(image_path, 'rb') as f:
-                        st.download_button(
-                            f"Download Image {i+1}",
-                            f.read(),
-                            file_name=f"courtroom_viz_{i+1}.png",
-                            mime="image/png"
-                        )
-                except Exception as e:
-                    st.error(f"Error displaying image {i+1}: {e}")
+        # One element for the whole set; Streamlit serves each file by path
+        st.image(
+            generated_images,
+            caption=[f"Visualization {i+1}" for i in range(len(generated_images))],
+            use_column_width=True
+        )
+        
+        with st.expander("⬇️ Download all"):
+            try:
+                st.download_button(
+                    f"Download {len(generated_images)} images (.zip)",
+                    _images_zip(tuple(generated_images)),
+                    file_name="courtroom_viz_images.zip",
+                    mime="application/zip"
+                )
+            except Exception as e:
+                st.error(f"Error packaging images: {e}")
     
     # Display analysis results
-    if analysis_result and analysis_result.get('success'):
+    # Serializing the report is only worth it when someone asked to see it
+    if debug and analysis_result and analysis_result.get('success'):
         st.subheader("🔍 AI Analysis Report")
         with st.expander("View Detailed Analysis"):
-            st.json(analysis_result)
+            st.json(_analysis_json(analysis_result))
 
 # ============================================================================
 # MAIN APPLICATION
 # ============================================================================
 
+@st.cache_resource
+def get_viz_engine(_client) -> GeminiVisualizationEngine:
+    """Build the Gemini visualization engine once per process"""
+    return GeminiVisualizationEngine(_client)
+
 def main():
     # Initialize components
     render_header()
@@ -725,15 +1157,23 @@ def main():
     # Initialize Gemini client
     client = initialize_gemini_client()
     
-    # Initialize engines
-    crew = LegalAnalysisCrew()
-    viz_engine = GeminiVisualizationEngine(client)
+    # Initialize the engine (built once per process; Streamlit reruns main() on every interaction)
+    viz_engine = get_viz_engine(client)
     
     # Sidebar configuration
-    config = render_sidebar()
+    with st.sidebar:
+        render_sidebar()
+        # Outside the fragment: toggling it must rerun the results view too
+        debug = st.checkbox(
+            "Debug view",
+            False,
+            help="Show the raw analysis JSON under each stage"
+        )
+    config = {**st.session_state.get('config', {}), 'debug': debug}
     
     # Input section
-    uploaded_files, raw_text, advanced_config = render_input_section()
+    render_input_section()
+    uploaded_files, raw_text, advanced_config = st.session_state.get('case_input', (None, None, None))
     
     # Process button
     st.divider()
@@ -752,7 +1192,7 @@ def main():
             return
         
         # Show processing dashboard
-        render_processing_dashboard()
+        dashboard = render_processing_dashboard()
         
         # Initialize session state for results
         if 'generated_images' not in st.session_state:
@@ -764,7 +1204,16 @@ def main():
             with st.spinner("Processing case data..."):
                 # Step 1: Extract content from files or use raw text
                 if uploaded_files:
-                    case_content = viz_engine.process_files_with_gemini(uploaded_files)
+                    # Work from temp files so the pipeline never copies whole uploads in memory
+                    spilled = spill_uploads(uploaded_files)
+                    try:
+                        case_content = viz_engine.process_files_with_gemini(spilled)
+                    finally:
+                        for upload in spilled:
+                            try:
+                                os.remove(upload.path)
+                            except OSError:
+                                pass
                 else:
                     case_content = raw_text
                 
@@ -773,10 +1222,11 @@ def main():
                     return
                 
                 st.success("✅ Case content extracted successfully")
+                update_dashboard_stage(dashboard, "documents", "✅ Content extracted")
             
             with st.spinner("Analyzing with AI agents..."):
                 # Step 2: Analyze with Crew AI
-                print("🤖 Starting AI Analysis Process...")
+                logger.debug("Starting AI analysis")
                 st.write("🤖 **Case files are analyzing...**")
                 
                 # Create a progress container for step-by-step logging
@@ -784,10 +1234,16 @@ def main():
                 
                 with progress_container:
                     # Step 1: Forensic Analysis
-                    print("📋 Step 1: Forensic Analysis")
+                    logger.debug("Step 1: forensic analysis")
                     st.write("📋 **Forensic Analysis**")
+                    # A fresh crew per analysis: its tasks carry this case's inputs
+                    crew = LegalAnalysisCrew()
                     analysis_result = crew.analyze_case(case_content, advanced_config)
-                st.session_state.analysis_result = analysis_result
+                # Session state survives every rerun; keep only what the results view needs
+                st.session_state.analysis_result = {
+                    key: analysis_result.get(key)
+                    for key in ('success', 'structured_analysis', 'timestamp')
+                }
                 
                 # Show detailed analysis result
                 st.write("🔍 **AI Analysis Complete - Results:**")
@@ -802,82 +1258,27 @@ def main():
                     st.write("**Error:**", analysis_result.get('error', 'Unknown error'))
                 
                 # Show raw analysis data for debugging
-                with st.expander("🔍 **Detailed Analysis Data**"):
-                    st.json(analysis_result)
+                if config.get('debug'):
+                    with st.expander("🔍 **Detailed Analysis Data**"):
+                        st.json(_analysis_json(analysis_result))
                 
                 if not analysis_result.get('success'):
                     st.error(f"AI analysis failed: {analysis_result.get('error')}")
                     return
                 
                 st.success("✅ AI analysis completed successfully!")
+                update_dashboard_stage(dashboard, "agents", "✅ Analysis complete")
             
             with st.spinner("Generating visualizations..."):
                 # Step 3: Extract image generation plan from analysis
-                print("🎨 Starting Image Generation Process...")
+                logger.debug("Starting image generation process")
                 st.write("🎨 **Generating visualizations...**")
                 
-                # Get the structured analysis data, not the string representation
-                analysis_data = analysis_result.get('structured_analysis', analysis_result.get('analysis', {}))
+                # analyze_case hands back a VisualDirectionModel, or None when there is no plan
+                image_generation_plan = analysis_result.get('structured_analysis')
                 
-                # Debug: Show the analysis result
-                print("📊 Extracting Image Generation Plan...")
-                print(f"   - Analysis data type: {type(analysis_data)}")
-                with st.expander("🔍 **Raw Analysis Data**"):
-                    st.json(analysis_data)
-                
-                # Extract image generation plan from the visual direction task
-                image_generation_plan = None
-                print("🔍 Searching for Image Generation Plan...")
-                
-                # Check if analysis_data is a Pydantic model (VisualDirectionModel)
-                if hasattr(analysis_data, 'image_specifications'):
-                    print("   - Found VisualDirectionModel Pydantic object")
-                    image_generation_plan = analysis_data
-                    print("   - Using Pydantic model directly for image generation")
-                elif isinstance(analysis_data, dict):
-                    print("   - Analysis data is a dictionary")
-                    # Try to find image generation plan in the analysis
-                    if 'image_generation_plan' in analysis_data:
-                        print("   - Found image_generation_plan in analysis data")
-                        image_generation_plan = analysis_data['image_generation_plan']
-                    elif 'structured_analysis' in analysis_data and analysis_data['structured_analysis']:
-                        print("   - Found structured_analysis data")
-                        structured_data = analysis_data['structured_analysis']
-                        if hasattr(structured_data, 'image_specifications'):
-                            print("   - Found VisualDirectionModel in structured data")
-                            image_generation_plan = structured_data
-                        else:
-                            print("   - No VisualDirectionModel in structured data")
-                            print("   - Available structured attributes:", dir(structured_data))
-                    elif 'raw_result' in analysis_data and hasattr(analysis_data['raw_result'], 'pydantic'):
-                        print("   - Found raw_result with pydantic data")
-                        pydantic_data = analysis_data['raw_result'].pydantic
-                        if hasattr(pydantic_data, 'image_specifications'):
-                            print("   - Found VisualDirectionModel in pydantic data")
-                            image_generation_plan = pydantic_data
-                        else:
-                            print("   - No VisualDirectionModel in pydantic data")
-                            print("   - Available pydantic attributes:", dir(pydantic_data))
-                    else:
-                        print("   - No structured data found")
-                        print("   - Available keys:", list(analysis_data.keys()))
-                else:
-                    print("   - Analysis data is not a dictionary or Pydantic model")
-                    print("   - Type:", type(analysis_data))
-                    # Try to parse as JSON if it's a string
-                    if isinstance(analysis_data, str):
-                        try:
-                            import json
-                            parsed_data = json.loads(analysis_data)
-                            print("   - Successfully parsed string as JSON")
-                            if 'image_specifications' in parsed_data:
-                                image_generation_plan = parsed_data
-                                print("   - Found image_specifications in parsed JSON")
-                        except Exception as e:
-                            print(f"   - Could not parse string as JSON: {e}")
-                
-                if not image_generation_plan:
-                    print("❌ No image generation plan found in analysis result")
+                if image_generation_plan is None:
+                    logger.warning("No image generation plan found in analysis result")
                     st.error("❌ No image generation plan found in analysis result")
                     st.write("**Troubleshooting:**")
                     st.write("- Check if visual_direction_task completed successfully")
@@ -885,23 +1286,15 @@ def main():
                     st.write("- Check the detailed analysis data above")
                     return
                 
+                if config.get('debug'):
+                    with st.expander("🔍 **Raw Analysis Data**"):
+                        st.json(image_generation_plan.model_dump(mode='json'))
+                
                 # Display the AI-generated plan
-                print("📋 AI-Generated Image Plan Found!")
                 st.write("📋 **Image Plan Ready**")
-                
-                # Handle both Pydantic model and dictionary
-                if hasattr(image_generation_plan, 'total_images'):
-                    # Pydantic model
-                    total_images = image_generation_plan.total_images
-                    image_specs = image_generation_plan.image_specifications
-                    print(f"   - Total images: {total_images}")
-                    print(f"   - Image specifications: {len(image_specs)} images planned")
-                else:
-                    # Dictionary
-                    total_images = image_generation_plan.get('total_images', 'Unknown')
-                    image_specs = image_generation_plan.get('image_specifications', [])
-                    print(f"   - Total images: {total_images}")
-                    print(f"   - Image specifications: {len(image_specs)} images planned")
+                total_images = image_generation_plan.total_images
+                image_specs = [_normalize_spec(spec) for spec in image_generation_plan.image_specifications]
+                logger.debug("Image plan: %s total, %d specifications", total_images, len(image_specs))
                 
                 st.write("**Total Images:**", total_images)
                 
@@ -909,34 +1302,27 @@ def main():
                 if image_specs:
                     with st.expander("📸 **Image Specifications Details**"):
                         for i, spec in enumerate(image_specs):
-                            if hasattr(spec, 'title'):
-                                # Pydantic model
-                                title = spec.title
-                                purpose = spec.purpose
-                                angle = spec.angle_description
-                                focus = spec.focus_elements
-                            else:
-                                # Dictionary
-                                title = spec.get('title', 'Untitled')
-                                purpose = spec.get('purpose', 'N/A')
-                                angle = spec.get('angle_description', 'N/A')
-                                focus = spec.get('focus_elements', [])
-                            
-                            st.write(f"**Image {i+1}:** {title}")
-                            st.write(f"  - Purpose: {purpose}")
-                            st.write(f"  - Angle: {angle}")
-                            st.write(f"  - Focus: {', '.join(focus) if isinstance(focus, list) else focus}")
+                            focus = spec.get('focus_elements') or []
+                            st.write(f"**Image {i+1}:** {spec.get('title', 'Untitled')}")
+                            st.write(f"  - Purpose: {spec.get('purpose', 'N/A')}")
+                            st.write(f"  - Angle: {spec.get('angle_description', 'N/A')}")
+                            st.write(f"  - Focus: {', '.join(focus) if isinstance(focus, (list, tuple)) else focus}")
                 
                 # Generate images based on the AI plan
-                print("🎬 Starting Image Generation...")
+                logger.debug("Generating images from plan")
                 st.write("🎬 **Creating images...**")
-                generated_images = viz_engine.generate_images_from_plan(image_generation_plan)
+                generated_images = viz_engine.generate_images_from_plan(
+                    image_generation_plan,
+                    batch_mode=config.get('batch_mode', False)
+                )
                 
                 st.session_state.generated_images = generated_images
                 
                 if generated_images:
                     st.success(f"✅ Generated {len(generated_images)} images based on AI analysis")
-                    st.write(f"📁 **Generated Files:** {generated_images}")
+                    update_dashboard_stage(dashboard, "scenes", f"✅ {len(generated_images)} images created")
+                    update_dashboard_stage(dashboard, "court", "✅ Ready for presentation")
+                    st.write(f"📁 **Generated Files:** {len(generated_images)} saved")
                 else:
                     st.warning("⚠️ No images were generated")
                     st.error("**Possible causes:**")
@@ -954,18 +1340,13 @@ def main():
         st.divider()
         render_results_section(
             st.session_state.get('generated_images', []),
-            st.session_state.get('analysis_result', {})
+            st.session_state.get('analysis_result', {}),
+            debug=config.get('debug', False)
         )
     
     # Footer with hackathon info
     st.divider()
-    st.markdown("""
-    <div style="text-align: center; padding: 2rem; color: #666;">
-        <h4>🍌 Built for Nano Banana Hackathon 2025</h4>
-        <p>Leveraging Gemini 2.5 Flash Image Preview for revolutionary legal visualization</p>
-        <p><strong>Key Features:</strong> PDF Processing • Multi-Agent AI Analysis • Multi-Angle Generation • Character Consistency</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_FOOTER_HTML, unsafe_allow_html=True)
 
 if __name__ == "__main__":
     main()
@@ -4,30 +4,95 @@
 from crewai import Agent, Crew, Process, Task, LLM
 from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import atexit
+import logging
+import logging.handlers
 import os
+import queue
+import re
+import time
 from datetime import datetime
+from pydantic import BaseModel, ValidationError
 from .models import (
     ForensicAnalysisModel, 
     SceneReconstructionModel, 
     CharacterConsistencyModel, 
-    VisualDirectionModel
+    VisualDirectionModel,
+    VISUAL_DIRECTION_ADAPTER,
+    parse_visual_direction,
+    warmup
 )
 
+logger = logging.getLogger(__name__)
+
+# Key content indicators a complete analysis should mention (case-insensitive)
+_INDICATOR_RE = re.compile(r"evidence|scene|timeline|character|visual", re.IGNORECASE)
+_MIN_INDICATORS = 2
+
+def _build_error_logger() -> logging.Logger:
+    """Error logger whose file writes happen on a QueueListener thread, not the caller's"""
+    error_logger = logging.getLogger("courtroom_viz.errors")
+    if not error_logger.handlers:  # Streamlit may re-import this module
+        log_queue = queue.SimpleQueue()
+        file_handler = logging.FileHandler("courtroom_viz_errors.log", delay=True)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+        listener = logging.handlers.QueueListener(log_queue, file_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        error_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        error_logger.setLevel(logging.ERROR)
+        error_logger.propagate = False
+    return error_logger
+
+error_logger = _build_error_logger()
+
+def _usage_dict(usage) -> Optional[Dict[str, Any]]:
+    """Plain-dict token usage from a CrewOutput, if it reported any"""
+    if usage is None:
+        return None
+    return usage.model_dump() if isinstance(usage, BaseModel) else dict(usage)
+
+def _visual_direction_from(result) -> Optional[VisualDirectionModel]:
+    """Coerce a crew result into a VisualDirectionModel, or None when it has no image plan"""
+    data = getattr(result, 'pydantic', None) or getattr(result, 'raw', None) or result
+    try:
+        if isinstance(data, VisualDirectionModel):
+            return data
+        if isinstance(data, BaseModel):
+            return VISUAL_DIRECTION_ADAPTER.validate_python(data.model_dump())
+        if isinstance(data, dict):
+            return VISUAL_DIRECTION_ADAPTER.validate_python(data.get('image_generation_plan', data))
+        if isinstance(data, (str, bytes)):
+            return parse_visual_direction(data)
+    except ValidationError as e:
+        logger.warning("Crew output is not a valid image plan: %d errors", e.error_count())
+    return None
+
+# Output schemas are deferred at import; build the ones the tasks validate once per
+# process, when the crew module loads, instead of during the first analysis
+warmup()
+
 @CrewBase
 class LegalAnalysisCrew:
-    """Legal Analysis Crew for Courtroom Visualization"""
+    """Legal Analysis Crew for Courtroom Visualization
+
+    Agents and tasks are memoized per instance and tasks interpolate inputs in
+    place, so build one crew per analysis rather than sharing it.
+    """
 
     agents: List[BaseAgent]
     tasks: List[Task]
 
     def __init__(self):
-        # Initialize Gemini LLM for CrewAI
+        # Gemini LLMs for CrewAI are built per agent (see _llm)
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        self.llm = LLM(
+
+    def _llm(self) -> LLM:
+        """Gemini LLM for one agent; each keeps its own token usage counter"""
+        return LLM(
             model="gemini/gemini-2.5-flash",
             temperature=0.1
         )
@@ -36,7 +101,7 @@ class LegalAnalysisCrew:
     def forensic_analyst(self) -> Agent:
         return Agent(
             config=self.agents_config['forensic_analyst'], # type: ignore[index]
-            llm=self.llm,
+            llm=self._llm(),
             verbose=True
         )
 
@@ -44,7 +109,7 @@ class LegalAnalysisCrew:
     def scene_reconstructor(self) -> Agent:
         return Agent(
             config=self.agents_config['scene_reconstructor'], # type: ignore[index]
-            llm=self.llm,
+            llm=self._llm(),
             verbose=True
         )
 
@@ -52,7 +117,7 @@ class LegalAnalysisCrew:
     def character_profiler(self) -> Agent:
         return Agent(
             config=self.agents_config['character_profiler'], # type: ignore[index]
-            llm=self.llm,
+            llm=self._llm(),
             verbose=True
         )
 
@@ -60,7 +125,7 @@ class LegalAnalysisCrew:
     def visual_director(self) -> Agent:
         return Agent(
             config=self.agents_config['visual_director'], # type: ignore[index]
-            llm=self.llm,
+            llm=self._llm(),
             verbose=True
         )
 
@@ -105,14 +170,7 @@ class LegalAnalysisCrew:
             process=Process.sequential,
             memory=False,  # Disable memory system (causing excessive API calls)
             planning=False,  # Disable planning system (causing errors)
-            # planning_llm=self.llm,  # Disabled due to planning system issues
-            embedder={
-                "provider": "google",  # Use Google embeddings
-                "config": {
-                    "api_key": os.getenv("GEMINI_API_KEY"),
-                    "model": "text-embedding-004"
-                }
-            },
+            # planning_llm=self._llm(),  # Disabled due to planning system issues
             verbose=True,
             output_log_file="courtroom_viz_analysis.log"
         )
@@ -143,8 +201,11 @@ class LegalAnalysisCrew:
         }
         
         try:
-            # Execute crew with enhanced error handling
+            # Execute crew with enhanced error handling; every task depends on the
+            # ones before it, so they run in order
+            started = time.perf_counter()
             result = self.crew().kickoff(inputs=inputs)
+            duration = time.perf_counter() - started
             
             # Validate the result
             validation_result = self.validate_analysis_output(result)
@@ -156,34 +217,24 @@ class LegalAnalysisCrew:
                 }
             
             # Extract the actual analysis content - prioritize Pydantic model
-            analysis_content = ""
-            structured_data = None
-            
             if hasattr(result, 'pydantic') and result.pydantic:
-                # Use Pydantic model as primary source
-                structured_data = result.pydantic
                 analysis_content = str(result.pydantic)
-                print(f"✅ Using Pydantic model output (type: {type(result.pydantic)})")
             elif hasattr(result, 'raw') and result.raw:
                 analysis_content = result.raw
-                print(f"⚠️ Using raw output (length: {len(result.raw)} chars)")
-                # Try to parse as JSON if it looks like structured data
-                try:
-                    import json
-                    if analysis_content.strip().startswith('{') and analysis_content.strip().endswith('}'):
-                        structured_data = json.loads(analysis_content)
-                        print("✅ Successfully parsed raw output as JSON")
-                except Exception as e:
-                    print(f"⚠️ Could not parse raw output as JSON: {e}")
             else:
                 analysis_content = str(result)
-                print(f"⚠️ Using string representation of result")
             
             return {
                 'success': True,
                 'analysis': analysis_content,
-                'structured_analysis': structured_data,  # Include structured data for context passing
-                'raw_result': result,
+                # Always a VisualDirectionModel or None, so callers never probe its shape
+                'structured_analysis': _visual_direction_from(result),
+                # A small summary instead of the CrewOutput (agent trace, task outputs, models),
+                # since callers keep this dict in Streamlit session state
+                'raw_result_summary': {
+                    'tokens': _usage_dict(getattr(result, 'token_usage', None)),
+                    'duration_seconds': round(duration, 2)
+                },
                 'timestamp': datetime.now().isoformat(),
                 'validation_passed': True
             }
@@ -192,9 +243,8 @@ class LegalAnalysisCrew:
             error_type = type(e).__name__
             error_message = str(e)
             
-            # Log the error for debugging
-            with open("courtroom_viz_errors.log", "a") as f:
-                f.write(f"{datetime.now().isoformat()} - {error_type}: {error_message}\n")
+            # Log the error (with traceback) for debugging; the file write is queued
+            error_logger.exception("Case analysis failed")
             
             return {
                 'success': False,
@@ -229,12 +279,15 @@ class LegalAnalysisCrew:
                         return (False, "Scene layout information missing")
             
             # Check for key content indicators
-            content_indicators = ['evidence', 'scene', 'timeline', 'character', 'visual']
             if hasattr(result, 'raw') and result.raw:
-                content_lower = result.raw.lower()
-                found_indicators = [indicator for indicator in content_indicators if indicator in content_lower]
-                if len(found_indicators) < 2:
-                    return (False, f"Insufficient content depth. Found only: {found_indicators}")
+                # One regex pass over the raw output, stopping once enough indicators are seen
+                found_indicators = set()
+                for match in _INDICATOR_RE.finditer(result.raw):
+                    found_indicators.add(match.group(0).lower())
+                    if len(found_indicators) >= _MIN_INDICATORS:
+                        break
+                if len(found_indicators) < _MIN_INDICATORS:
+                    return (False, f"Insufficient content depth. Found only: {sorted(found_indicators)}")
             
             return (True, result)
             